@@ -3,9 +3,9 @@ import os
 import sys
 from datetime import datetime
 from os.path import join
+from zoneinfo import ZoneInfo
 
 import dotenv
-import pytz
 from rich.logging import RichHandler
 
 dotenv.load_dotenv()
@@ -19,7 +19,7 @@ os.makedirs(parent_reports_dir, exist_ok=True)
 
 
 def setup_logger(project_root: str) -> str:
-    today = datetime.now(pytz.timezone("Asia/Almaty"))
+    today = datetime.now(ZoneInfo("Asia/Almaty"))
 
     logging.Formatter.converter = lambda *args: today.timetuple()
 
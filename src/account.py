@@ -1,13 +1,16 @@
 import dataclasses
-from typing import Dict, List, Union
+from collections import defaultdict
+from typing import DefaultDict, Dict, List, Union
 
 from google.ads.googleads.client import GoogleAdsClient
 from google.ads.googleads.v16.resources.types.customer_client import CustomerClient
+from google.ads.googleads.v16.services.types.google_ads_service import GoogleAdsRow
 
 from src.error_handler import handle_google_ads_exception
+from src.utils import thread_map
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class GAccount:
     id: int
     name: str
@@ -18,9 +21,6 @@ class GAccount:
     level: int
     time_zone: str
 
-    def __iter__(self):
-        return iter(dataclasses.astuple(self))
-
 
 @handle_google_ads_exception
 def account_structure(
@@ -48,38 +48,41 @@ def account_structure(
         WHERE customer_client.level <= 1
     """
 
+    def search(account_id: int) -> List[GoogleAdsRow]:
+        stream = googleads_service.search_stream(
+            customer_id=str(account_id), query=query
+        )
+        return [row for batch in stream for row in batch.results]
+
     for processed_account_id in processed_account_ids:
         unprocessed_account_ids: List[int] = [processed_account_id]
-        customer_ids_to_child_accounts: Dict[int, List[CustomerClient]] = {}
+        customer_ids_to_child_accounts: DefaultDict[int, List[CustomerClient]] = (
+            defaultdict(list)
+        )
         root_account_client = None
 
         while unprocessed_account_ids:
-            account_id = int(unprocessed_account_ids.pop(0))
-            response = googleads_service.search(
-                customer_id=str(account_id), query=query
-            )
-
-            assert response is not None
+            pending_account_ids = list(dict.fromkeys(unprocessed_account_ids))
+            unprocessed_account_ids = []
+            responses = thread_map(search, pending_account_ids)
 
-            for googleads_row in response:
-                account_client = googleads_row.customer_client
+            for account_id, response in zip(pending_account_ids, responses):
+                for googleads_row in response:
+                    account_client = googleads_row.customer_client
 
-                if account_client.level == 0:
-                    if root_account_client is None:
-                        root_account_client = account_client
-                    continue
+                    if account_client.level == 0:
+                        if root_account_client is None:
+                            root_account_client = account_client
+                        continue
 
-                if account_id not in customer_ids_to_child_accounts:
-                    customer_ids_to_child_accounts[account_id] = []
+                    customer_ids_to_child_accounts[account_id].append(account_client)
 
-                customer_ids_to_child_accounts[account_id].append(account_client)
-
-                if account_client.manager:
-                    if (
-                        account_client.id not in customer_ids_to_child_accounts
-                        and account_client.level == 1
-                    ):
-                        unprocessed_account_ids.append(account_client.id)
+                    if account_client.manager:
+                        if (
+                            account_client.id not in customer_ids_to_child_accounts
+                            and account_client.level == 1
+                        ):
+                            unprocessed_account_ids.append(account_client.id)
 
         if root_account_client is not None:
             accounts.extend(
@@ -95,30 +98,26 @@ def account_structure(
 def parse_account_hierarchy(
     account_client: CustomerClient,
     account_ids_to_child_accounts: Dict[int, List[CustomerClient]],
-    depth: int = 0,
 ) -> List[GAccount]:
     accounts: List[GAccount] = []
 
-    account_id = account_client.id
-    accounts.append(
-        GAccount(
-            id=account_id,
-            name=account_client.descriptive_name,
-            resource_name=account_client.resource_name,
-            account_customer=account_client.client_customer,
-            manager=account_client.manager,
-            currency_code=account_client.currency_code,
-            level=account_client.level,
-            time_zone=account_client.time_zone,
+    stack = [account_client]
+    while stack:
+        account_client = stack.pop()
+        accounts.append(
+            GAccount(
+                id=account_client.id,
+                name=account_client.descriptive_name,
+                resource_name=account_client.resource_name,
+                account_customer=account_client.client_customer,
+                manager=account_client.manager,
+                currency_code=account_client.currency_code,
+                level=account_client.level,
+                time_zone=account_client.time_zone,
+            )
         )
-    )
 
-    if account_id in account_ids_to_child_accounts:
-        for child_account in account_ids_to_child_accounts[account_id]:
-            accounts.extend(
-                parse_account_hierarchy(
-                    child_account, account_ids_to_child_accounts, depth + 1
-                )
-            )
+        child_accounts = account_ids_to_child_accounts.get(account_client.id, [])
+        stack.extend(reversed(child_accounts))
 
     return accounts
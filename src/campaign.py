@@ -1,12 +1,14 @@
 import dataclasses
+from itertools import chain
 from typing import List
 
 from google.ads.googleads.client import GoogleAdsClient
 
 from src.error_handler import handle_google_ads_exception
+from src.utils import thread_map
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class GCampaign:
     id: int
     account_id: int
@@ -18,16 +20,11 @@ class GCampaign:
     start_date: str
     end_date: str
 
-    def __iter__(self):
-        return iter(dataclasses.astuple(self))
-
 
 @handle_google_ads_exception
 def campaign_structure(
     client: GoogleAdsClient, account_ids: List[int]
 ) -> List[GCampaign]:
-    campaigns: List[GCampaign] = []
-
     ga_service = client.get_service("GoogleAdsService")
 
     query = """
@@ -44,23 +41,23 @@ def campaign_structure(
         ORDER BY campaign.id
     """
 
-    for account_id in account_ids:
+    def fetch(account_id: int) -> List[GCampaign]:
         stream = ga_service.search_stream(customer_id=str(account_id), query=query)
 
-        for batch in stream:
-            for row in batch.results:
-                campaigns.append(
-                    GCampaign(
-                        id=row.campaign.id,
-                        account_id=account_id,
-                        name=row.campaign.name,
-                        resource_name=row.campaign.resource_name,
-                        status=row.campaign.status.name,
-                        advertising_channel_type=row.campaign.advertising_channel_type.name,
-                        advertising_channel_sub_type=row.campaign.advertising_channel_sub_type.name,
-                        start_date=row.campaign.start_date,
-                        end_date=row.campaign.end_date,
-                    )
-                )
-
-    return campaigns
+        return [
+            GCampaign(
+                id=row.campaign.id,
+                account_id=account_id,
+                name=row.campaign.name,
+                resource_name=row.campaign.resource_name,
+                status=row.campaign.status.name,
+                advertising_channel_type=row.campaign.advertising_channel_type.name,
+                advertising_channel_sub_type=row.campaign.advertising_channel_sub_type.name,
+                start_date=row.campaign.start_date,
+                end_date=row.campaign.end_date,
+            )
+            for batch in stream
+            for row in batch.results
+        ]
+
+    return list(chain.from_iterable(thread_map(fetch, account_ids)))
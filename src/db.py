@@ -1,24 +1,57 @@
 import dataclasses
-import json
+import functools
 import logging
+import operator
 import os
-from typing import Union
+from datetime import date
+from typing import Any, Callable, Dict, Mapping, Sequence
 
+import ijson
+import orjson
 from sqlalchemy import create_engine as _create_engine
-from sqlalchemy import insert, select, update
-from sqlalchemy.engine.base import Engine
+from sqlalchemy import Table, bindparam, event, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine.base import Connection, Engine
 from sqlalchemy.sql import Insert, Update
 
 from src.account import GAccount
 from src.ad import GAd
 from src.ad_group import GAdGroup
 from src.campaign import GCampaign
-from src.metrics import GMetricsFactory, GMetricsType
 from src.models import Account, Ad, AdGroup, Base, Campaign, MetricsFactory, MetricsType
 from src.utils import batched
 
 logger = logging.getLogger(__name__)
 BATCH_SIZE = 2000
+COMMIT_EVERY = 10
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-200000",
+    "PRAGMA mmap_size=30000000000",
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class ReportPaths:
+    accounts: str
+    campaigns: str
+    ad_groups: str
+    ads: str
+    general_metrics: str
+    gender_metrics: str
+    age_metrics: str
+    geo_metrics: str
+
+    @classmethod
+    def from_dir(cls, reports_dir: str) -> "ReportPaths":
+        return cls(
+            **{
+                field.name: os.path.join(reports_dir, f"{field.name}.json")
+                for field in dataclasses.fields(cls)
+            }
+        )
 
 
 def build_connection_url() -> str:
@@ -56,150 +89,160 @@ def build_connection_url() -> str:
         db_path = os.path.join(project_dir, "google.db")
         connection_url = f"sqlite:///{db_path}"
 
-    logger.debug(f"Connection URL: {connection_url}")
+    logger.debug("Connection URL: %s", connection_url)
     return connection_url
 
 
+def set_sqlite_pragmas(dbapi_connection: Any, _: Any) -> None:
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
 def create_engine(connection_url: str, echo: bool) -> Engine:
     if "sqlite" in connection_url:
         engine = _create_engine(connection_url, future=True, echo=echo)
+        event.listen(engine, "connect", set_sqlite_pragmas)
     else:
         engine = _create_engine(
-            connection_url, future=True, use_setinputsizes=False, echo=echo
+            connection_url,
+            future=True,
+            use_setinputsizes=False,
+            fast_executemany=True,
+            echo=echo,
         )
     return engine
 
 
-def insert_accounts(current_day_report_dir: str, engine: Engine) -> None:
-    accounts_json = os.path.join(current_day_report_dir, "accounts.json")
-    with open(accounts_json, "r") as file:
-        accounts = iter(GAccount(**account) for account in json.load(file))
-
-    with engine.begin() as connection:
-        for record in accounts:
-            account = Account(**dataclasses.asdict(record))
-
-            logger.debug(f"Inserting account: {account}")
-
-            stmt: Union[Insert, Update]
-            if connection.execute(
-                select(Account.id).where(Account.id == account.id)
-            ).fetchone():
-                stmt = (
-                    update(Account)
-                    .where(Account.id == account.id)
-                    .values(**account.to_dict(exclude_cols=["id"]))
-                )
-            else:
-                stmt = insert(Account).values(**account.to_dict())
-            connection.execute(stmt)
-
-
-def insert_campaigns(current_day_report_dir: str, engine: Engine) -> None:
-    campaigns_json = os.path.join(current_day_report_dir, "campaigns.json")
-    with open(campaigns_json, "r") as file:
-        campaigns = iter(GCampaign(**campaign) for campaign in json.load(file))
-
-    with engine.begin() as connection:
-        for record in campaigns:
-            campaign = Campaign(**dataclasses.asdict(record))
-            logger.debug(f"Inserting campaign: {campaign}")
-
-            stmt: Union[Insert, Update]
-            if connection.execute(
-                select(Campaign.id).where(Campaign.id == campaign.id)
-            ).fetchone():
-                stmt = (
-                    update(Campaign)
-                    .where(Campaign.id == campaign.id)
-                    .values(**campaign.to_dict(exclude_cols=["id"]))
-                )
-            else:
-                stmt = insert(Campaign).values(**campaign.to_dict())
-            connection.execute(stmt)
-
-
-def insert_ad_groups(current_day_report_dir: str, engine: Engine) -> None:
-    ad_groups_json = os.path.join(current_day_report_dir, "ad_groups.json")
-    with open(ad_groups_json, "r") as file:
-        ad_groups = iter(GAdGroup(**ad_group) for ad_group in json.load(file))
-
-    with engine.begin() as connection:
-        for record in ad_groups:
-            ad_group = AdGroup(**dataclasses.asdict(record))
-            logger.debug(f"Inserting ad_group: {ad_group}")
-
-            stmt: Union[Insert, Update]
-            if connection.execute(
-                select(AdGroup.id).where(AdGroup.id == ad_group.id)
-            ).fetchone():
-                stmt = (
-                    update(AdGroup)
-                    .where(AdGroup.id == ad_group.id)
-                    .values(**ad_group.to_dict(exclude_cols=["id"]))
-                )
-            else:
-                stmt = insert(AdGroup).values(**ad_group.to_dict())
-            connection.execute(stmt)
-
-
-def insert_ads(current_day_report_dir: str, engine: Engine) -> None:
-    ads_json = os.path.join(current_day_report_dir, "ads.json")
-    with open(ads_json, "r") as file:
-        ads = iter(GAd(**ad) for ad in json.load(file))
-
-    with engine.begin() as connection:
-        for record in ads:
-            ad = Ad(**dataclasses.asdict(record))
-            logger.debug(f"Inserting ad: {ad}")
-
-            stmt: Union[Insert, Update]
-            if connection.execute(select(Ad.id).where(Ad.id == ad.id)).fetchone():
-                stmt = (
-                    update(Ad)
-                    .where(Ad.id == ad.id)
-                    .values(**ad.to_dict(exclude_cols=["id"]))
-                )
-            else:
-                stmt = insert(Ad).values(**ad.to_dict())
-            connection.execute(stmt)
+@functools.lru_cache(maxsize=None)
+def row_factory(cls: type) -> Callable[[Any], Dict[str, Any]]:
+    field_names = tuple(field.name for field in dataclasses.fields(cls))
+    get_values = operator.attrgetter(*field_names)
+
+    def to_row(record: Any) -> Dict[str, Any]:
+        return dict(zip(field_names, get_values(record)))
+
+    return to_row
+
+
+@functools.lru_cache(maxsize=None)
+def sqlite_upsert_statement(table: Table) -> Insert:
+    stmt = sqlite_insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=["id"],
+        set_={
+            column.name: stmt.excluded[column.name]
+            for column in table.columns
+            if column.name != "id"
+        },
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def update_by_id_statement(table: Table) -> Update:
+    return table.update().where(table.c.id == bindparam("_id"))
+
+
+def upsert(
+    connection: Connection,
+    table: Table,
+    rows: Sequence[Mapping[str, Any]],
+) -> None:
+    if connection.dialect.name == "sqlite":
+        connection.execute(sqlite_upsert_statement(table), rows)
+        return
+
+    rows_by_id = {row["id"]: row for row in rows}
+    existing_ids = {
+        row.id
+        for row in connection.execute(
+            select(table.c.id).where(table.c.id.in_(list(rows_by_id)))
+        )
+    }
+
+    to_update = [
+        {"_id": row_id, **{key: value for key, value in row.items() if key != "id"}}
+        for row_id, row in rows_by_id.items()
+        if row_id in existing_ids
+    ]
+    to_insert = [
+        row for row_id, row in rows_by_id.items() if row_id not in existing_ids
+    ]
+
+    if to_update:
+        connection.execute(update_by_id_statement(table), to_update)
+    if to_insert:
+        connection.execute(table.insert(), to_insert)
+
+
+def insert_accounts(accounts_json: str, connection: Connection) -> None:
+    with open(accounts_json, "rb") as file:
+        to_row = row_factory(GAccount)
+        accounts = [
+            to_row(GAccount(**account)) for account in orjson.loads(file.read())
+        ]
+
+    for batch in batched(accounts, BATCH_SIZE):
+        upsert(connection, Account.__table__, batch)
+    logger.debug("Accounts - %d rows upserted.", len(accounts))
+
+
+def insert_campaigns(campaigns_json: str, connection: Connection) -> None:
+    with open(campaigns_json, "rb") as file:
+        to_row = row_factory(GCampaign)
+        campaigns = [
+            to_row(GCampaign(**campaign)) for campaign in orjson.loads(file.read())
+        ]
+
+    for batch in batched(campaigns, BATCH_SIZE):
+        upsert(connection, Campaign.__table__, batch)
+    logger.debug("Campaigns - %d rows upserted.", len(campaigns))
+
+
+def insert_ad_groups(ad_groups_json: str, connection: Connection) -> None:
+    with open(ad_groups_json, "rb") as file:
+        to_row = row_factory(GAdGroup)
+        ad_groups = [
+            to_row(GAdGroup(**ad_group)) for ad_group in orjson.loads(file.read())
+        ]
+
+    for batch in batched(ad_groups, BATCH_SIZE):
+        upsert(connection, AdGroup.__table__, batch)
+    logger.debug("AdGroups - %d rows upserted.", len(ad_groups))
+
+
+def insert_ads(ads_json: str, connection: Connection) -> None:
+    with open(ads_json, "rb") as file:
+        to_row = row_factory(GAd)
+        ads = [to_row(GAd(**ad)) for ad in orjson.loads(file.read())]
+
+    for batch in batched(ads, BATCH_SIZE):
+        upsert(connection, Ad.__table__, batch)
+    logger.debug("Ads - %d rows upserted.", len(ads))
 
 
 def insert_metrics(
     json_report: str,
-    engine: Engine,
-    g_metrics_type: GMetricsType,
+    connection: Connection,
     db_metrics_type: MetricsType,
 ) -> None:
-    with open(json_report, "r") as file:
-        g_metrics = [
-            GMetricsFactory.create_metrics(g_metrics_type, **metric)
-            for metric in json.load(file)
-        ]
-
     DBMetrics = MetricsFactory.create_metrics(db_metrics_type)
+    column_names = tuple(column.name for column in DBMetrics.__table__.columns)
+
+    def to_row(metric: Mapping[str, Any]) -> Dict[str, Any]:
+        row = {name: metric[name] for name in column_names}
+        row["date"] = date.fromisoformat(row["date"])
+        return row
 
-    batch_count = len(g_metrics) // BATCH_SIZE + 1
-    for idx, batch in enumerate(batched(g_metrics, BATCH_SIZE), start=1):
-        with engine.begin() as connection:
-            for record in batch:
-                metrics = DBMetrics(**dataclasses.asdict(record))
-
-                stmt: Union[Insert, Update]
-                if connection.execute(
-                    select(DBMetrics.id).where(DBMetrics.id == metrics.id)
-                ).fetchone():
-                    stmt = (
-                        update(DBMetrics)
-                        .where(DBMetrics.id == metrics.id)
-                        .values(**metrics.to_dict(exclude_cols=["id"]))
-                    )
-                else:
-                    stmt = insert(DBMetrics).values(**metrics.to_dict())
-                connection.execute(stmt)
-            logger.debug(
-                f"{db_metrics_type.value} - Batch {idx}/{batch_count} inserted."
-            )
+    with open(json_report, "rb") as file:
+        rows = (to_row(metric) for metric in ijson.items(file, "item", use_float=True))
+
+        for idx, batch in enumerate(batched(rows, BATCH_SIZE), start=1):
+            upsert(connection, DBMetrics.__table__, batch)
+            if idx % COMMIT_EVERY == 0:
+                connection.commit()
+            logger.debug("%s - Batch %d inserted.", db_metrics_type.value, idx)
 
 
 def populate_db(current_day_report_dir: str) -> None:
@@ -210,19 +253,17 @@ def populate_db(current_day_report_dir: str) -> None:
 
     logger.info("Starting DB population...")
 
-    insert_accounts(current_day_report_dir, engine)
-    insert_campaigns(current_day_report_dir, engine)
-    insert_ad_groups(current_day_report_dir, engine)
-    insert_ads(current_day_report_dir, engine)
+    paths = ReportPaths.from_dir(current_day_report_dir)
 
-    general_metrics_json = os.path.join(current_day_report_dir, "general_metrics.json")
-    gender_metrics_json = os.path.join(current_day_report_dir, "gender_metrics.json")
-    age_metrics_json = os.path.join(current_day_report_dir, "age_metrics.json")
-    geo_metrics_json = os.path.join(current_day_report_dir, "geo_metrics.json")
+    with engine.connect() as connection:
+        insert_accounts(paths.accounts, connection)
+        insert_campaigns(paths.campaigns, connection)
+        insert_ad_groups(paths.ad_groups, connection)
+        insert_ads(paths.ads, connection)
+        connection.commit()
 
-    insert_metrics(
-        general_metrics_json, engine, GMetricsType.GENERAL, MetricsType.GENERAL
-    )
-    insert_metrics(gender_metrics_json, engine, GMetricsType.GENDER, MetricsType.GENDER)
-    insert_metrics(age_metrics_json, engine, GMetricsType.AGE, MetricsType.AGE)
-    insert_metrics(geo_metrics_json, engine, GMetricsType.GEO, MetricsType.GEO)
+        insert_metrics(paths.general_metrics, connection, MetricsType.GENERAL)
+        insert_metrics(paths.gender_metrics, connection, MetricsType.GENDER)
+        insert_metrics(paths.age_metrics, connection, MetricsType.AGE)
+        insert_metrics(paths.geo_metrics, connection, MetricsType.GEO)
+        connection.commit()
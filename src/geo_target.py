@@ -1,283 +1,281 @@
+import io
 import logging
 import os
 import urllib.parse
 import zipfile
-from typing import Union
+from typing import IO, Dict, Iterable, Iterator, Mapping, Optional, Tuple
 
-import bs4
-import pandas as pd
+import lxml.html
+import orjson
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 import requests
-from sqlalchemy import insert, select, update
+from requests.adapters import HTTPAdapter
+from sqlalchemy import Column, MetaData, Table, exists, insert, select
 from sqlalchemy.engine.base import Engine
-from sqlalchemy.sql import Insert, Update
+from urllib3.util.retry import Retry
 
-from src.db import build_connection_url, create_engine
+from src import project_dir as default_project_dir
+from src.db import build_connection_url, create_engine, upsert
 from src.models import GeoTarget
 from src.utils import batched
 
+BATCH_SIZE = 10_000
+BLOCK_SIZE = 4 * 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+META_FILE_NAME = ".geo_targets.meta.json"
+
+SESSION = requests.Session()
+SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=4,
+        max_retries=Retry(total=3, backoff_factor=0.5),
+    ),
+)
+
+CSV_SCHEMA = pa.schema(
+    [
+        ("Criteria ID", pa.int64()),
+        ("Name", pa.string()),
+        ("Canonical Name", pa.string()),
+        ("Parent ID", pa.int64()),
+        ("Country Code", pa.string()),
+        ("Target Type", pa.string()),
+        ("Status", pa.string()),
+    ]
+)
+CSV_COLUMNS = {
+    "Criteria ID": "id",
+    "Name": "name",
+    "Canonical Name": "canonical_name",
+    "Parent ID": "parent_id",
+    "Country Code": "country_code",
+    "Target Type": "target_type",
+    "Status": "status",
+}
+
+RESTRICTED_GEO_TARGETS = (
+    {
+        "id": 21120,
+        "name": "Crimea",
+        "canonical_name": "Crimea",
+        "parent_id": None,
+        "country_code": "UA",
+        "target_type": "Country",
+        "status": "Active",
+    },
+    {
+        "id": 2192,
+        "name": "Cuba",
+        "canonical_name": "Cuba",
+        "parent_id": None,
+        "country_code": "CU",
+        "target_type": "Country",
+        "status": "Active",
+    },
+    {
+        "id": 21113,
+        "name": "So-called Donetsk People's Republic (DNR)",
+        "canonical_name": "So-called Donetsk People's Republic (DNR)",
+        "parent_id": None,
+        "country_code": "UA",
+        "target_type": "Country",
+        "status": "Active",
+    },
+    {
+        "id": 21111,
+        "name": "So-called Luhansk People's Republic (LNR)",
+        "canonical_name": "So-called Luhansk People's Republic (LNR)",
+        "parent_id": None,
+        "country_code": "UA",
+        "target_type": "Country",
+        "status": "Active",
+    },
+    {
+        "id": 2364,
+        "name": "Iran",
+        "canonical_name": "Iran",
+        "parent_id": None,
+        "country_code": "IR",
+        "target_type": "Country",
+        "status": "Active",
+    },
+    {
+        "id": 2770,
+        "name": "North Korea",
+        "canonical_name": "North Korea",
+        "parent_id": None,
+        "country_code": "KP",
+        "target_type": "Country",
+        "status": "Active",
+    },
+    {
+        "id": 2760,
+        "name": "Syria",
+        "canonical_name": "Syria",
+        "parent_id": None,
+        "country_code": "SY",
+        "target_type": "Country",
+        "status": "Active",
+    },
+    {
+        "id": 2408,
+        "name": "North Korea",
+        "canonical_name": "North Korea",
+        "parent_id": None,
+        "country_code": "KP",
+        "target_type": "Country",
+        "status": "Active",
+    },
+)
+
 
 def get_geo_targets_zip_url(base_url: str) -> str:
     logging.info("Getting geo targets zip URL...")
 
     doc_endpoint = "/google-ads/api/data/geotargets"
     url = urllib.parse.urljoin(base_url, doc_endpoint)
-    response = requests.get(url)
+    response = SESSION.get(url)
     response.raise_for_status()
 
-    strainer = bs4.SoupStrainer(
-        name="div", attrs={"class": lambda cl: "devsite-article-body" in cl.split()}
+    document = lxml.html.fromstring(response.content)
+    hrefs = document.xpath(
+        '//h2[@id="download_csv_of_geo_targets"]/following::a[1]/@href'
     )
-    soup = bs4.BeautifulSoup(response.text, "html.parser", parse_only=strainer)
-    assert len(soup) > 0, "No content found"
-
-    anchor_parent = soup.find("h2", attrs={"id": "download_csv_of_geo_targets"})
-    assert anchor_parent is not None, "Anchor parent not found"
-
-    anchor = anchor_parent.find_next("a")
-    assert anchor is not None, "Anchor not found"
-    assert isinstance(anchor, bs4.Tag), "Anchor is not a tag"
-
-    rel_download_url = anchor.get("href")
-    assert rel_download_url is not None, "Download URL not found"
-    assert isinstance(rel_download_url, str), "Download URL is not a string"
+    assert isinstance(hrefs, list) and hrefs, "Download URL not found"
 
+    rel_download_url = str(hrefs[0])
     download_url = urllib.parse.urljoin(base_url, rel_download_url)
 
     logging.info(f"Geo targets zip URL: {download_url}")
     return download_url
 
 
-def download_geo_targets_zip(download_url: str, output_path: str) -> None:
-    logging.info("Downloading geo targets zip...")
+def load_meta(meta_path: str) -> Dict[str, str]:
+    if not os.path.exists(meta_path):
+        return {}
+    with open(meta_path, "rb") as f:
+        return orjson.loads(f.read())
 
-    response = requests.get(download_url)
-    response.raise_for_status()
 
-    if os.path.exists(output_path):
-        logging.warning(f"File already exists: {output_path} - overwriting")
+def save_meta(meta_path: str, meta: Mapping[str, str]) -> None:
+    with open(meta_path, "wb") as f:
+        f.write(orjson.dumps(meta))
 
-    with open(output_path, "wb") as f:
-        f.write(response.content)
 
-    logging.info(f"Geo targets zip saved to {output_path}")
+def download_geo_targets_zip(
+    download_url: str, meta: Mapping[str, str]
+) -> Optional[Tuple[io.BytesIO, Dict[str, str]]]:
+    logging.info("Downloading geo targets zip...")
 
+    headers = {}
+    if "etag" in meta:
+        headers["If-None-Match"] = meta["etag"]
+    if "last_modified" in meta:
+        headers["If-Modified-Since"] = meta["last_modified"]
+
+    buffer = io.BytesIO()
+    with SESSION.get(download_url, headers=headers, stream=True) as response:
+        if response.status_code == 304:
+            logging.info("Geo targets zip not modified since last download")
+            return None
+
+        response.raise_for_status()
+        for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+            buffer.write(chunk)
+
+        validators = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+    buffer.seek(0)
 
-def extract_geo_targets_zip(zip_file_path: str, output_dir: str) -> None:
-    logging.info("Extracting geo targets zip...")
+    logging.info(f"Geo targets zip downloaded: {buffer.getbuffer().nbytes} bytes")
 
-    if not os.path.exists(output_dir):
-        logging.warning(f"Output directory does not exist: {output_dir} - creating")
-        os.makedirs(output_dir)
+    new_meta = {key: value for key, value in validators.items() if value is not None}
+    return buffer, new_meta
 
-    with zipfile.ZipFile(zip_file_path, "r") as zip_ref:
-        zip_ref.extractall(output_dir)
 
-    logging.info(f"Geo targets extracted to {output_dir}")
+def find_csv(zip_file: zipfile.ZipFile) -> zipfile.ZipInfo:
+    csv_info = next(
+        (info for info in zip_file.infolist() if info.filename.endswith(".csv")),
+        None,
+    )
+    assert csv_info is not None, "CSV file not found"
+    return csv_info
 
 
-def parse_csv(resources_dir: str) -> pd.DataFrame:
+def parse_csv_chunks(csv_file: IO[bytes]) -> Iterator[pa.RecordBatch]:
     logging.info("Parsing geo targets CSV...")
 
-    csv_file_path = next(
-        (
-            os.path.join(resources_dir, f)
-            for f in os.listdir(resources_dir)
-            if f.endswith(".csv")
+    reader = pa_csv.open_csv(
+        csv_file,
+        read_options=pa_csv.ReadOptions(block_size=BLOCK_SIZE),
+        convert_options=pa_csv.ConvertOptions(
+            column_types=CSV_SCHEMA, strings_can_be_null=True
         ),
-        None,
-    )
-    assert csv_file_path is not None, "CSV file not found"
-
-    logging.info(f"Latest geo targets fetched and saved to {csv_file_path}")
-
-    df = pd.read_csv(
-        csv_file_path,
-        dtype={
-            "Criteria ID": "Int64",
-            "Name": "string",
-            "Canonical Name": "string",
-            "Parent ID": "Int64",
-            "Country Code": "string",
-            "Target Type": "string",
-            "Status": "string",
-        },
-    )
-
-    df = df.rename(
-        columns={
-            "Criteria ID": "id",
-            "Name": "name",
-            "Canonical Name": "canonical_name",
-            "Parent ID": "parent_id",
-            "Country Code": "country_code",
-            "Target Type": "target_type",
-            "Status": "status",
-        }
     )
-    logging.info(f"Geo targets CSV parsed to DataFrame: {df.shape}")
+    names = [CSV_COLUMNS[name] for name in reader.schema.names]
+    for batch in reader:
+        yield pa.RecordBatch.from_arrays(batch.columns, names=names)
 
-    return df
 
+def geo_targets_exist(engine: Engine) -> bool:
+    with engine.connect() as connection:
+        row = connection.execute(select(GeoTarget.id).limit(1)).first()
+    return row is not None
 
-def insert_geo_targets(df: pd.DataFrame) -> None:
-    logging.info("Saving geo targets to database...")
 
-    connection_url = build_connection_url()
+def create_stage_table(engine: Engine) -> Table:
+    columns = [
+        Column(column.name, column.type) for column in GeoTarget.__table__.columns
+    ]
+    #  NOTE: A regular table, not a #temp table: pyodbc's fast_executemany cannot
+    #  describe the parameters of a local temp table on SQL Server
+    metadata = MetaData(schema=GeoTarget.metadata.schema)
+    stage = Table("GeoTargetsStage", metadata, *columns)
+    stage.drop(bind=engine, checkfirst=True)
+    stage.create(bind=engine)
+    return stage
 
-    logging.info("Creating database engine...")
-    engine: Engine = create_engine(connection_url, echo=False)
-    logging.info("Database engine created")
 
-    GeoTarget.__table__.create(bind=engine, checkfirst=True)
+def insert_geo_targets(engine: Engine, chunks: Iterable[pa.RecordBatch]) -> None:
+    logging.info("Saving geo targets to database...")
 
-    logging.info("Checking for existing geo targets...")
-    with engine.connect() as connection:
-        existing_ids = {
-            row[0] for row in connection.execute(select(GeoTarget.id)).fetchall()
-        }
+    stage = create_stage_table(engine)
+    try:
+        with engine.begin() as connection:
+            logging.info("Staging geo targets...")
+            for chunk_idx, chunk in enumerate(chunks, start=1):
+                for batch in batched(chunk.to_pylist(), BATCH_SIZE):
+                    connection.execute(insert(stage), batch)
+                logging.debug(
+                    f"GeoTarget - Chunk {chunk_idx}: {chunk.num_rows} rows staged."
+                )
 
-    df = df[~df["id"].isin(existing_ids)]
-    logging.info(f"New geo targets to insert: {df.shape}")
+            logging.info("Inserting new geo targets...")
+            new_rows = select(stage).where(~exists().where(GeoTarget.id == stage.c.id))
+            result = connection.execute(
+                insert(GeoTarget).from_select(list(stage.c.keys()), new_rows)
+            )
+            inserted = result.rowcount
+    finally:
+        stage.drop(bind=engine)
 
-    if df.empty:
+    if inserted == 0:
         logging.info("No new geo targets to insert")
         return
 
-    logging.info("Inserting geo targets...")
+    logging.info(f"Geo targets saved to database: {inserted} new rows")
 
-    batch_size = 25000
-    records = df.to_dict(orient="records")
-    batch_count = len(records) // batch_size + 1
-    for idx, batch in enumerate(batched(records, batch_size), start=1):
-        with engine.begin() as connection:
-            connection.execute(insert(GeoTarget), batch)
-        logging.debug(f"GeoTarget - Batch {idx}/{batch_count} inserted.")
-
-    logging.info("Geo targets saved to database")
-
-
-def insert_restricted_locations() -> None:
-    restricted_geo_targets = [
-        GeoTarget(
-            id=21120,
-            name="Crimea",
-            canonical_name="Crimea",
-            parent_id=None,
-            country_code="UA",
-            target_type="Country",
-            status="Active",
-        ),
-        GeoTarget(
-            id=2192,
-            name="Cuba",
-            canonical_name="Cuba",
-            parent_id=None,
-            country_code="CU",
-            target_type="Country",
-            status="Active",
-        ),
-        GeoTarget(
-            id=21113,
-            name="So-called Donetsk People's Republic (DNR)",
-            canonical_name="So-called Donetsk People's Republic (DNR)",
-            parent_id=None,
-            country_code="UA",
-            target_type="Country",
-            status="Active",
-        ),
-        GeoTarget(
-            id=21111,
-            name="So-called Luhansk People's Republic (LNR)",
-            canonical_name="So-called Luhansk People's Republic (LNR)",
-            parent_id=None,
-            country_code="UA",
-            target_type="Country",
-            status="Active",
-        ),
-        GeoTarget(
-            id=2364,
-            name="Iran",
-            canonical_name="Iran",
-            parent_id=None,
-            country_code="IR",
-            target_type="Country",
-            status="Active",
-        ),
-        GeoTarget(
-            id=2770,
-            name="North Korea",
-            canonical_name="North Korea",
-            parent_id=None,
-            country_code="KP",
-            target_type="Country",
-            status="Active",
-        ),
-        GeoTarget(
-            id=2760,
-            name="Syria",
-            canonical_name="Syria",
-            parent_id=None,
-            country_code="SY",
-            target_type="Country",
-            status="Active",
-        ),
-        GeoTarget(
-            id=2408,
-            name="North Korea",
-            canonical_name="North Korea",
-            parent_id=None,
-            country_code="KP",
-            target_type="Country",
-            status="Active",
-        ),
-        GeoTarget(
-            id=2760,
-            name="Syria",
-            canonical_name="Syria",
-            parent_id=None,
-            country_code="SY",
-            target_type="Country",
-            status="Active",
-        ),
-    ]
 
+def insert_restricted_locations(engine: Engine) -> None:
     logging.info("Saving restricted geo targets to database...")
 
-    connection_url = build_connection_url()
-
-    logging.info("Creating database engine...")
-    engine: Engine = create_engine(connection_url, echo=False)
-    logging.info("Database engine created")
-
     with engine.begin() as connection:
-        for geo_target in restricted_geo_targets:
-            stmt: Union[Insert, Update]
-            if connection.execute(
-                select(GeoTarget.id).where(GeoTarget.id == geo_target.id)
-            ).fetchone():
-                stmt = (
-                    update(GeoTarget)
-                    .where(GeoTarget.id == geo_target.id)
-                    .values(
-                        name=geo_target.name,
-                        canonical_name=geo_target.canonical_name,
-                        parent_id=geo_target.parent_id,
-                        country_code=geo_target.country_code,
-                        target_type=geo_target.target_type,
-                        status=geo_target.status,
-                    )
-                )
-            else:
-                stmt = insert(GeoTarget).values(
-                    id=geo_target.id,
-                    name=geo_target.name,
-                    canonical_name=geo_target.canonical_name,
-                    parent_id=geo_target.parent_id,
-                    country_code=geo_target.country_code,
-                    target_type=geo_target.target_type,
-                    status=geo_target.status,
-                )
-            connection.execute(stmt)
+        upsert(connection, GeoTarget.__table__, list(RESTRICTED_GEO_TARGETS))
     logging.info("Restricted geo targets saved to database")
 
 
@@ -289,7 +287,7 @@ def fetch_latest_geo_targets() -> None:
     logging.info(f"PROJECT_DIR: {project_dir}")
     if project_dir is None:
         logging.warning("PROJECT_DIR not set. Using current working directory.")
-        project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        project_dir = default_project_dir
         os.environ["PROJECT_DIR"] = project_dir
         logging.info(f"PROJECT_DIR: {project_dir}")
 
@@ -300,15 +298,40 @@ def fetch_latest_geo_targets() -> None:
     base_url = "https://developers.google.com"
     download_url = get_geo_targets_zip_url(base_url)
 
-    zip_file_name = download_url.split("/")[-1]
-    zip_file_path = os.path.join(resources_dir, zip_file_name)
+    connection_url = build_connection_url()
+
+    logging.info("Creating database engine...")
+    engine: Engine = create_engine(connection_url, echo=False)
+    logging.info("Database engine created")
+
+    GeoTarget.__table__.create(bind=engine, checkfirst=True)
+
+    meta_path = os.path.join(resources_dir, META_FILE_NAME)
+    meta = load_meta(meta_path)
+    if meta and not geo_targets_exist(engine):
+        logging.warning("GeoTargets table is empty - ignoring cached metadata")
+        meta = {}
+
+    download = download_geo_targets_zip(download_url, meta)
+    if download is None:
+        logging.info("Geo targets unchanged - skipping download")
+        insert_restricted_locations(engine)
+        return
+
+    buffer, new_meta = download
+    with zipfile.ZipFile(buffer, "r") as zip_file:
+        csv_info = find_csv(zip_file)
+        logging.info(f"Latest geo targets fetched: {csv_info.filename}")
 
-    download_geo_targets_zip(download_url, zip_file_path)
-    extract_geo_targets_zip(zip_file_path, resources_dir)
+        new_meta["csv_crc32"] = f"{csv_info.CRC:08x}"
+        if new_meta["csv_crc32"] == meta.get("csv_crc32"):
+            logging.info("Geo targets CSV unchanged - skipping insert")
+        else:
+            with zip_file.open(csv_info) as csv_file:
+                insert_geo_targets(engine, parse_csv_chunks(csv_file))
+    insert_restricted_locations(engine)
 
-    df = parse_csv(resources_dir)
-    insert_geo_targets(df)
-    insert_restricted_locations()
+    save_meta(meta_path, new_meta)
 
 
 if __name__ == "__main__":
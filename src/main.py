@@ -1,116 +1,98 @@
-import json
 import logging
 import os
 import sys
-from dataclasses import asdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from typing import Any, List, Mapping
+from typing import Any, Sequence
+from zoneinfo import ZoneInfo
 
-import pytz
+import orjson
 from google.ads.googleads.client import GoogleAdsClient
 
+from src import project_dir
 from src.account import account_structure
 from src.ad import ad_structure
 from src.ad_group import ad_group_structure
 from src.campaign import campaign_structure
-from src.db import populate_db
+from src.db import ReportPaths, populate_db
 from src.error_handler import handle_global_exception
 from src.geo_target import fetch_latest_geo_targets
-from src.metrics import GMetricsType, fetch_metrics
+from src.metrics import GMetricsType, fetch_all_metrics
 
 assert sys.version_info >= (3,), "Python 3 is required"
 
 
-def save(data: List[Mapping[str, Any]], path: str) -> None:
+def save(data: Sequence[Any], path: str) -> None:
     if os.path.exists(path):
         logging.warning(f"File already exists: {path} - overwriting")
     else:
         logging.info(f"Saving to {path}")
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
+    with open(path, "wb") as f:
+        f.write(orjson.dumps(data))
 
 
 def collect_data(
     client: GoogleAdsClient, root_account_id: str, reports_dir: str
 ) -> None:
-    accounts = account_structure(client, root_account_id)
-    logging.info(f"Collected {len(accounts)} accounts")
-    save(
-        [asdict(account) for account in accounts],
-        os.path.join(reports_dir, "accounts.json"),
-    )
+    paths = ReportPaths.from_dir(reports_dir)
 
-    account_ids = [account.id for account in accounts]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = []
 
-    campaigns = campaign_structure(client, account_ids)
-    logging.info(f"Collected {len(campaigns)} campaigns")
-    save(
-        [asdict(campaign) for campaign in campaigns],
-        os.path.join(reports_dir, "campaigns.json"),
-    )
+        accounts = account_structure(client, root_account_id)
+        logging.info(f"Collected {len(accounts)} accounts")
+        futures.append(executor.submit(save, accounts, paths.accounts))
 
-    ad_groups = ad_group_structure(client, account_ids)
-    logging.info(f"Collected {len(ad_groups)} ad groups")
-    save(
-        [asdict(ad_group) for ad_group in ad_groups],
-        os.path.join(reports_dir, "ad_groups.json"),
-    )
+        account_ids = [account.id for account in accounts]
 
-    ads = ad_structure(client, account_ids)
-    logging.info(f"Collected {len(ads)} ads")
-    save([asdict(ad) for ad in ads], os.path.join(reports_dir, "ads.json"))
+        campaigns = campaign_structure(client, account_ids)
+        logging.info(f"Collected {len(campaigns)} campaigns")
+        futures.append(executor.submit(save, campaigns, paths.campaigns))
 
-    #  NOTE: Change the date range as needed
+        ad_groups = ad_group_structure(client, account_ids)
+        logging.info(f"Collected {len(ad_groups)} ad groups")
+        futures.append(executor.submit(save, ad_groups, paths.ad_groups))
 
-    condition = "segments.date DURING LAST_7_DAYS"
-    # condition = f"segments.date BETWEEN '2023-07-01' AND '{datetime.now(pytz.utc).strftime('%Y-%m-%d')}'"
+        ads = ad_structure(client, account_ids)
+        logging.info(f"Collected {len(ads)} ads")
+        futures.append(executor.submit(save, ads, paths.ads))
 
-    general_metrics = fetch_metrics(
-        GMetricsType.GENERAL,
-        client,
-        accounts,
-        condition,
-    )
-    logging.info(f"Collected {len(general_metrics)} general metrics")
-    save(
-        [metric.to_dict() for metric in general_metrics],
-        os.path.join(reports_dir, "general_metrics.json"),
-    )
+        #  NOTE: Change the date range as needed
 
-    gender_metrics = fetch_metrics(GMetricsType.GENDER, client, accounts, condition)
-    logging.info(f"Collected {len(gender_metrics)} gender metrics")
-    save(
-        [metric.to_dict() for metric in gender_metrics],
-        os.path.join(reports_dir, "gender_metrics.json"),
-    )
+        condition = "segments.date DURING LAST_7_DAYS"
+        # condition = f"segments.date BETWEEN '2023-07-01' AND '{datetime.now(ZoneInfo('UTC')).strftime('%Y-%m-%d')}'"
 
-    age_metrics = fetch_metrics(GMetricsType.AGE, client, accounts, condition)
-    logging.info(f"Collected {len(age_metrics)} age metrics")
-    save(
-        [metric.to_dict() for metric in age_metrics],
-        os.path.join(reports_dir, "age_metrics.json"),
-    )
+        metrics = fetch_all_metrics(client, accounts, condition)
+        general_metrics = metrics[GMetricsType.GENERAL]
+        gender_metrics = metrics[GMetricsType.GENDER]
+        age_metrics = metrics[GMetricsType.AGE]
+        geo_metrics = metrics[GMetricsType.GEO]
 
-    geo_metrics = fetch_metrics(GMetricsType.GEO, client, accounts, condition)
-    logging.info(f"Collected {len(geo_metrics)} geo metrics")
-    save(
-        [metric.to_dict() for metric in geo_metrics],
-        os.path.join(reports_dir, "geo_metrics.json"),
-    )
+        logging.info(f"Collected {len(general_metrics)} general metrics")
+        futures.append(executor.submit(save, general_metrics, paths.general_metrics))
+
+        logging.info(f"Collected {len(gender_metrics)} gender metrics")
+        futures.append(executor.submit(save, gender_metrics, paths.gender_metrics))
+
+        logging.info(f"Collected {len(age_metrics)} age metrics")
+        futures.append(executor.submit(save, age_metrics, paths.age_metrics))
+
+        logging.info(f"Collected {len(geo_metrics)} geo metrics")
+        futures.append(executor.submit(save, geo_metrics, paths.geo_metrics))
+
+        for future in as_completed(futures):
+            future.result()
 
 
 @handle_global_exception
 def main() -> None:
     logging.info("Starting the main process...")
-    today = datetime.now(pytz.timezone("Asia/Almaty"))
+    today = datetime.now(ZoneInfo("Asia/Almaty"))
     year_month = today.strftime("%Y-%m")
 
-    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     os.environ["PROJECT_DIR"] = project_dir
     logging.info(f"PROJECT_DIR: {project_dir}")
 
-    fetch_latest_geo_targets()
-
     parent_reports_dir = os.path.join(project_dir, "reports")
     os.makedirs(parent_reports_dir, exist_ok=True)
     logging.info(f"Parent reports directory: {parent_reports_dir}")
@@ -125,7 +107,11 @@ def main() -> None:
     logging.info("Google Ads client loaded")
     root_account_id = "4091725735"
     logging.info(f"Root account ID: {root_account_id}")
-    collect_data(client, root_account_id, current_day_reports_dir)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        geo_targets_future = executor.submit(fetch_latest_geo_targets)
+        collect_data(client, root_account_id, current_day_reports_dir)
+        geo_targets_future.result()
 
     populate_db(current_day_reports_dir)
 
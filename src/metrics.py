@@ -1,16 +1,17 @@
-import ctypes
 import dataclasses
+import functools
 import logging
 from datetime import date as dt
-from datetime import datetime
 from enum import Enum
-from typing import Any, Callable, List, Mapping, Sequence, Union
+from itertools import product
+from typing import Any, Callable, Dict, List, Sequence, Tuple, Union, cast
 
 from google.ads.googleads.client import GoogleAdsClient
 from google.ads.googleads.v16.services.types.google_ads_service import GoogleAdsRow
 
 from src.account import GAccount
 from src.error_handler import handle_google_ads_exception
+from src.utils import thread_map
 
 
 class GMetricsType(Enum):
@@ -20,22 +21,7 @@ class GMetricsType(Enum):
     GEO = "GGeoMetrics"
 
 
-class GMetricsFactory:
-    @staticmethod
-    def create_metrics(metric_type: GMetricsType, **kwargs: Any) -> "GMetrics":
-        if metric_type == GMetricsType.GENERAL:
-            return GGeneralMetrics(**kwargs)
-        elif metric_type == GMetricsType.GENDER:
-            return GGenderMetrics(**kwargs)
-        elif metric_type == GMetricsType.AGE:
-            return GAgeMetrics(**kwargs)
-        elif metric_type == GMetricsType.GEO:
-            return GGeoMetrics(**kwargs)
-        else:
-            raise ValueError(f"Invalid metric type: {metric_type}")
-
-
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class GMetrics:
     average_cpv: float
     average_cpm: float
@@ -53,141 +39,145 @@ class GMetrics:
     video_view_rate: float
     ctr: float
 
-    def __iter__(self):
-        return iter(dataclasses.astuple(self))
-
-    def to_dict(self) -> Mapping[str, Any]:
-        self_dict = dataclasses.asdict(self)
-        if "date" in self_dict and isinstance(self_dict["date"], dt):
-            self_dict["date"] = self_dict["date"].isoformat()
-        return self_dict
 
-
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class GGeneralMetrics(GMetrics):
     id: int
     campaign_id: int
     device: str
-    date: Union[dt, str]
+    date: dt
     engagement_rate: float
 
     def __hash__(self):
         return hash(self.id)
 
-    def __post_init__(self):
-        if isinstance(self.date, str):
-            self.date = datetime.fromisoformat(self.date).date()
-
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class GGenderMetrics(GMetrics):
     id: int
     campaign_id: int
     ad_group_id: int
     gender: str
     device: str
-    date: Union[dt, str]
+    date: dt
     engagement_rate: float
 
     def __hash__(self):
         return hash(self.id)
 
-    def __post_init__(self):
-        if isinstance(self.date, str):
-            self.date = datetime.fromisoformat(self.date).date()
 
-
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class GAgeMetrics(GMetrics):
     id: int
     campaign_id: int
     ad_group_id: int
     age_range: str
     device: str
-    date: Union[dt, str]
+    date: dt
     engagement_rate: float
 
     def __hash__(self):
         return hash(self.id)
 
-    def __post_init__(self):
-        if isinstance(self.date, str):
-            self.date = datetime.fromisoformat(self.date).date()
-
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class GGeoMetrics(GMetrics):
     id: int
     campaign_id: int
     country_id: int
     device: str
-    date: Union[dt, str]
+    date: dt
 
     def __hash__(self):
         return hash(self.id)
 
-    def __post_init__(self):
-        if isinstance(self.date, str):
-            self.date = datetime.fromisoformat(self.date).date()
-
 
 Metrics = Union[GGeneralMetrics, GGenderMetrics, GAgeMetrics, GGeoMetrics]
 
-
-def handle_shared_metrics(row: GoogleAdsRow) -> Mapping[str, Any]:
-    cost_micros = row.metrics.cost_micros
+#  NOTE: Order must match the GMetrics field order
+SharedMetrics = Tuple[
+    float,
+    float,
+    int,
+    float,
+    int,
+    int,
+    float,
+    float,
+    float,
+    float,
+    float,
+    int,
+    int,
+    float,
+    float,
+]
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_ads_date(value: str) -> dt:
+    return dt.fromisoformat(value)
+
+
+def handle_shared_metrics(row: GoogleAdsRow) -> SharedMetrics:
+    metrics = row.metrics
+    cost_micros = metrics.cost_micros
     cost = round(cost_micros / 1_000_000, 2)
 
-    return {
-        "average_cpv": row.metrics.average_cpv,
-        "average_cpm": row.metrics.average_cpm,
-        "cost_micros": cost_micros,
-        "cost": cost,
-        "impressions": row.metrics.impressions,
-        "interactions": row.metrics.interactions,
-        "interaction_rate": row.metrics.interaction_rate,
-        "average_cost": row.metrics.average_cost,
-        "conversions": row.metrics.conversions,
-        "cost_per_conversion": row.metrics.cost_per_conversion,
-        "conversions_from_interactions_rate": row.metrics.conversions_from_interactions_rate,
-        "clicks": row.metrics.clicks,
-        "video_views": row.metrics.video_views,
-        "video_view_rate": row.metrics.video_view_rate,
-        "ctr": row.metrics.ctr,
-    }
+    #  NOTE: Order must match the GMetrics field order
+    return (
+        metrics.average_cpv,
+        metrics.average_cpm,
+        cost_micros,
+        cost,
+        metrics.impressions,
+        metrics.interactions,
+        metrics.interaction_rate,
+        metrics.average_cost,
+        metrics.conversions,
+        metrics.cost_per_conversion,
+        metrics.conversions_from_interactions_rate,
+        metrics.clicks,
+        metrics.video_views,
+        metrics.video_view_rate,
+        metrics.ctr,
+    )
 
 
 def handle_general_metrics(row: GoogleAdsRow) -> GGeneralMetrics:
+    segments = row.segments
     campaign_id = row.campaign.id
-    device = row.segments.device.name
-    date = datetime.strptime(row.segments.date, "%Y-%m-%d").date()
-    metrics_id = ctypes.c_uint32(hash(f"{campaign_id}_{device}_{date}")).value
+    device = segments.device.name
+    date = _parse_ads_date(segments.date)
+    metrics_id = hash((campaign_id, device, date)) & 0xFFFFFFFF
 
     shared_metrics = handle_shared_metrics(row)
 
     return GGeneralMetrics(
+        *shared_metrics,
         id=metrics_id,
         campaign_id=campaign_id,
         device=device,
         date=date,
         engagement_rate=row.metrics.engagement_rate,
-        **shared_metrics,
     )
 
 
 def handle_gender_metrics(row: GoogleAdsRow) -> GGenderMetrics:
+    segments = row.segments
     campaign_id = row.campaign.id
     ad_group_id = row.ad_group.id
-    device = row.segments.device.name
-    date = datetime.strptime(row.segments.date, "%Y-%m-%d").date()
+    device = segments.device.name
+    date = _parse_ads_date(segments.date)
     gender = row.ad_group_criterion.gender.type_.name
-    gender_metrics_id = ctypes.c_uint32(
-        hash(f"{campaign_id}_{ad_group_id}_{device}_{date}_{gender}")
-    ).value
+    gender_metrics_id = (
+        hash((campaign_id, ad_group_id, device, date, gender)) & 0xFFFFFFFF
+    )
 
     shared_metrics = handle_shared_metrics(row)
 
     return GGenderMetrics(
+        *shared_metrics,
         id=gender_metrics_id,
         campaign_id=campaign_id,
         device=device,
@@ -195,23 +185,24 @@ def handle_gender_metrics(row: GoogleAdsRow) -> GGenderMetrics:
         gender=gender,
         date=date,
         engagement_rate=row.metrics.engagement_rate,
-        **shared_metrics,
     )
 
 
 def handle_age_metrics(row: GoogleAdsRow) -> GAgeMetrics:
+    segments = row.segments
     campaign_id = row.campaign.id
     ad_group_id = row.ad_group.id
-    device = row.segments.device.name
-    date = datetime.strptime(row.segments.date, "%Y-%m-%d").date()
+    device = segments.device.name
+    date = _parse_ads_date(segments.date)
     age_range = row.ad_group_criterion.age_range.type_.name
-    age_metrics_id = ctypes.c_uint32(
-        hash(f"{campaign_id}_{ad_group_id}_{device}_{date}_{age_range}")
-    ).value
+    age_metrics_id = (
+        hash((campaign_id, ad_group_id, device, date, age_range)) & 0xFFFFFFFF
+    )
 
     shared_metrics = handle_shared_metrics(row)
 
     return GAgeMetrics(
+        *shared_metrics,
         id=age_metrics_id,
         campaign_id=campaign_id,
         ad_group_id=ad_group_id,
@@ -219,60 +210,45 @@ def handle_age_metrics(row: GoogleAdsRow) -> GAgeMetrics:
         device=device,
         date=date,
         engagement_rate=row.metrics.engagement_rate,
-        **shared_metrics,
     )
 
 
 def handle_geo_metrics(row: GoogleAdsRow) -> GGeoMetrics:
+    segments = row.segments
     campaign_id = row.campaign.id
-    date = row.segments.date
+    date = _parse_ads_date(segments.date)
     country_id = row.geographic_view.country_criterion_id
-    device = row.segments.device.name
-    geo_metrics_id = ctypes.c_uint32(
-        hash(f"{campaign_id}_{device}_{date}_{country_id}")
-    ).value
+    device = segments.device.name
+    geo_metrics_id = hash((campaign_id, device, date, country_id)) & 0xFFFFFFFF
 
     shared_metrics = handle_shared_metrics(row)
 
     return GGeoMetrics(
+        *shared_metrics,
         id=geo_metrics_id,
         campaign_id=campaign_id,
         country_id=country_id,
         date=date,
         device=device,
-        **shared_metrics,
     )
 
 
 @handle_google_ads_exception
 def _fetch_metrics(
-    client: GoogleAdsClient,
+    service: Any,
     ga_query: str,
-    accounts: List[GAccount],
+    account_id: int,
     handle_metrics: Callable[[GoogleAdsRow], Metrics],
 ) -> List[Metrics]:
-    service = client.get_service("GoogleAdsService")
-
-    metrics: List[Metrics] = []
-
-    for account in accounts:
-        if account.manager:
-            continue
-
-        account_id = account.id
-        stream = service.search_stream(customer_id=str(account_id), query=ga_query)
-
-        metrics.extend(
-            [handle_metrics(row) for batch in stream for row in batch.results]
-        )
-
-    return metrics
+    stream = service.search_stream(customer_id=str(account_id), query=ga_query)
+    return [handle_metrics(row) for batch in stream for row in batch.results]
 
 
+@functools.lru_cache(maxsize=64)
 def generate_query(
-    fields: List[str], table: str, condition: str, order_by: List[str]
+    fields: Tuple[str, ...], table: str, condition: str, order_by: Tuple[str, ...]
 ) -> str:
-    metrics = [
+    metrics = (
         "metrics.average_cpv",
         "metrics.average_cpm",
         "metrics.cost_micros",
@@ -287,10 +263,10 @@ def generate_query(
         "metrics.video_views",
         "metrics.video_view_rate",
         "metrics.ctr",
-    ]
+    )
 
     if table != "geographic_view":
-        fields.append("metrics.engagement_rate")
+        fields += ("metrics.engagement_rate",)
 
     select_fields = ", ".join(fields + metrics)
     order_by_stmts = ", ".join(order_by)
@@ -305,93 +281,74 @@ def generate_query(
     return query
 
 
-def fetch_general_metrics(
-    client: GoogleAdsClient, accounts: List[GAccount], condition: str
-) -> List[GGeneralMetrics]:
-    logging.info("Fetching general metrics...")
-
-    general_query = generate_query(
-        fields=["campaign.id", "segments.date", "segments.device"],
+def general_metrics_query(condition: str) -> str:
+    return generate_query(
+        fields=("campaign.id", "segments.date", "segments.device"),
         table="campaign",
         condition=condition,
-        order_by=["segments.date ASC"],
-    )
-
-    logging.debug(f"General query: {general_query}")
-
-    general_metrics = _fetch_metrics(
-        client, general_query, accounts, handle_general_metrics
+        order_by=("segments.date ASC",),
     )
 
-    logging.info("General metrics fetched.")
 
-    return general_metrics
-
-
-def fetch_gender_metrics(
-    client: GoogleAdsClient, accounts: List[GAccount], condition: str
-) -> List[GGenderMetrics]:
-    gender_query = generate_query(
-        fields=[
+def gender_metrics_query(condition: str) -> str:
+    return generate_query(
+        fields=(
             "gender_view.resource_name",
             "campaign.id",
             "ad_group.id",
             "ad_group_criterion.gender.type",
             "segments.date",
             "segments.device",
-        ],
+        ),
         table="gender_view",
         condition=condition,
-        order_by=["segments.date ASC"],
+        order_by=("segments.date ASC",),
     )
 
-    gender_metrics = _fetch_metrics(
-        client, gender_query, accounts, handle_gender_metrics
-    )
-
-    return gender_metrics
 
-
-def fetch_age_metrics(
-    client: GoogleAdsClient, accounts: List[GAccount], condition: str
-) -> List[GAgeMetrics]:
-    age_query = generate_query(
-        fields=[
+def age_metrics_query(condition: str) -> str:
+    return generate_query(
+        fields=(
             "age_range_view.resource_name",
             "campaign.id",
             "ad_group.id",
             "ad_group_criterion.age_range.type",
             "segments.date",
             "segments.device",
-        ],
+        ),
         table="age_range_view",
         condition=condition,
-        order_by=["segments.date ASC"],
+        order_by=("segments.date ASC",),
     )
 
-    age_metrics = _fetch_metrics(client, age_query, accounts, handle_age_metrics)
-
-    return age_metrics
 
-
-def fetch_geo_metrics(
-    client: GoogleAdsClient, accounts: List[GAccount], condition: str
-) -> List[GGeoMetrics]:
-    geo_query = generate_query(
-        fields=[
+def geo_metrics_query(condition: str) -> str:
+    return generate_query(
+        fields=(
             "geographic_view.country_criterion_id",
             "campaign.id",
             "segments.date",
             "segments.device",
-        ],
+        ),
         table="geographic_view",
         condition=condition,
-        order_by=["segments.date ASC"],
+        order_by=("segments.date ASC",),
     )
 
-    geo_metrics = _fetch_metrics(client, geo_query, accounts, handle_geo_metrics)
 
-    return geo_metrics
+METRICS_QUERIES: Dict[GMetricsType, Callable[[str], str]] = {
+    GMetricsType.GENERAL: general_metrics_query,
+    GMetricsType.GENDER: gender_metrics_query,
+    GMetricsType.AGE: age_metrics_query,
+    GMetricsType.GEO: geo_metrics_query,
+}
+
+METRICS_HANDLERS: Dict[GMetricsType, Callable[[GoogleAdsRow], Metrics]] = {
+    GMetricsType.GENERAL: handle_general_metrics,
+    GMetricsType.GENDER: handle_gender_metrics,
+    GMetricsType.AGE: handle_age_metrics,
+    GMetricsType.GEO: handle_geo_metrics,
+}
 
 
 def fetch_metrics(
@@ -399,27 +356,89 @@ def fetch_metrics(
     client: GoogleAdsClient,
     accounts: List[GAccount],
     condition: str,
-) -> Sequence[Union[GGeneralMetrics, GGenderMetrics, GAgeMetrics, GGeoMetrics]]:
-    metrics: Sequence[Union[GGeneralMetrics, GGenderMetrics, GAgeMetrics, GGeoMetrics]]
-    if g_metrics_type == GMetricsType.GENERAL:
-        metrics = fetch_general_metrics(client, accounts, condition)
-    elif g_metrics_type == GMetricsType.GENDER:
-        metrics = fetch_gender_metrics(client, accounts, condition)
-    elif g_metrics_type == GMetricsType.AGE:
-        metrics = fetch_age_metrics(client, accounts, condition)
-    elif g_metrics_type == GMetricsType.GEO:
-        metrics = fetch_geo_metrics(client, accounts, condition)
-    else:
-        raise ValueError(f"Invalid metrics type: {g_metrics_type}")
+) -> Sequence[Metrics]:
+    metrics = fetch_all_metrics(client, accounts, condition, (g_metrics_type,))
+    return metrics[g_metrics_type]
+
+
+def fetch_general_metrics(
+    client: GoogleAdsClient, accounts: List[GAccount], condition: str
+) -> List[GGeneralMetrics]:
+    metrics = fetch_metrics(GMetricsType.GENERAL, client, accounts, condition)
+    return cast(List[GGeneralMetrics], metrics)
+
+
+def fetch_gender_metrics(
+    client: GoogleAdsClient, accounts: List[GAccount], condition: str
+) -> List[GGenderMetrics]:
+    metrics = fetch_metrics(GMetricsType.GENDER, client, accounts, condition)
+    return cast(List[GGenderMetrics], metrics)
+
+
+def fetch_age_metrics(
+    client: GoogleAdsClient, accounts: List[GAccount], condition: str
+) -> List[GAgeMetrics]:
+    metrics = fetch_metrics(GMetricsType.AGE, client, accounts, condition)
+    return cast(List[GAgeMetrics], metrics)
+
+
+def fetch_geo_metrics(
+    client: GoogleAdsClient, accounts: List[GAccount], condition: str
+) -> List[GGeoMetrics]:
+    metrics = fetch_metrics(GMetricsType.GEO, client, accounts, condition)
+    return cast(List[GGeoMetrics], metrics)
+
+
+def fetch_all_metrics(
+    client: GoogleAdsClient,
+    accounts: List[GAccount],
+    condition: str,
+    g_metrics_types: Sequence[GMetricsType] = tuple(GMetricsType),
+) -> Dict[GMetricsType, Sequence[Metrics]]:
+    queries: Dict[GMetricsType, str] = {}
+    for g_metrics_type in g_metrics_types:
+        if g_metrics_type not in METRICS_QUERIES:
+            raise ValueError(f"Invalid metrics type: {g_metrics_type}")
+        queries[g_metrics_type] = METRICS_QUERIES[g_metrics_type](condition)
+        logging.debug(f"{g_metrics_type.value} query: {queries[g_metrics_type]}")
+
+    service = client.get_service("GoogleAdsService")
+    account_ids = [account.id for account in accounts if not account.manager]
+
+    #  NOTE: One flat pool over (type, account) pairs keeps the number of
+    #  concurrent search_stream calls bounded by MAX_CONCURRENT_REQUESTS
+    jobs = list(product(g_metrics_types, account_ids))
+
+    def fetch(job: Tuple[GMetricsType, int]) -> List[Metrics]:
+        g_metrics_type, account_id = job
+        return _fetch_metrics(
+            service,
+            queries[g_metrics_type],
+            account_id,
+            METRICS_HANDLERS[g_metrics_type],
+        )
+
+    for g_metrics_type in g_metrics_types:
+        logging.info(f"Fetching {g_metrics_type.name.lower()} metrics...")
+    results = dict(zip(jobs, thread_map(fetch, jobs)))
+
+    metrics: Dict[GMetricsType, Sequence[Metrics]] = {}
+    for g_metrics_type in g_metrics_types:
+        metrics[g_metrics_type] = [
+            row
+            for account_id in account_ids
+            for row in results[(g_metrics_type, account_id)]
+        ]
+        logging.info(f"{g_metrics_type.name.capitalize()} metrics fetched.")
 
     return metrics
 
 
 #  INFO: Don't use this function in production. It's only for testing purposes.
 def main() -> None:
-    import json
     import os
 
+    import orjson
     import rich
 
     project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -430,8 +449,8 @@ def main() -> None:
         os.path.join(project_dir, "google-ads.yaml")
     )
 
-    with open(r"D:\Work\google_ads\reports\2024-04\accounts.json", "r") as f:
-        accounts = [GAccount(**account) for account in json.load(f)]
+    with open(r"D:\Work\google_ads\reports\2024-04\accounts.json", "rb") as f:
+        accounts = [GAccount(**account) for account in orjson.loads(f.read())]
 
     metrics = fetch_metrics(
         GMetricsType.GENERAL,
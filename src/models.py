@@ -2,7 +2,7 @@ import logging
 import os
 from abc import abstractmethod
 from enum import Enum
-from typing import Any, Dict, List, Optional
+from typing import Any, ClassVar, Dict, List, Optional
 
 from sqlalchemy import (
     NVARCHAR,
@@ -13,6 +13,7 @@ from sqlalchemy import (
     ForeignKey,
     Integer,
     MetaData,
+    Table,
 )
 from sqlalchemy.orm import DeclarativeBase, relationship
 
@@ -23,6 +24,7 @@ logger = logging.getLogger(__name__)
 
 class Base(DeclarativeBase):
     __abstract__ = True
+    __table__: ClassVar[Table]
     metadata = MetaData(schema=schema)
 
     @property
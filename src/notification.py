@@ -1,11 +1,27 @@
 import logging
 import os
-import time
 import urllib.parse
 from typing import Callable, Dict, List, Optional, Tuple
 
 import requests
 import requests.adapters
+from urllib3.util.retry import Retry
+
+SESSION = requests.Session()
+SESSION.mount(
+    "https://",
+    requests.adapters.HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=4,
+        max_retries=Retry(
+            total=5,
+            backoff_factor=1,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({"POST"}),
+            raise_on_status=False,
+        ),
+    ),
+)
 
 
 def _send_message(
@@ -21,7 +37,7 @@ def _send_message(
     url = urllib.parse.urljoin(api_url, "sendMessage")
     send_data["text"] = message
 
-    response = requests.post(url, data=send_data, files=files)
+    response = SESSION.post(url, data=send_data, files=files)
 
     method = url.split("/")[-1]
     data = "" if not hasattr(response, "json") else response.json()
@@ -53,10 +69,8 @@ def send_with_retry(
     chat_id: str,
     message: Optional[str] = "...",
 ) -> bool:
-    retry = 0
-    while retry < 10:
+    for idx, token in enumerate(tokens, start=1):
         try:
-            token = tokens[retry % len(tokens)]
             send_func(token, chat_id, message)
             return True
         except (
@@ -65,14 +79,10 @@ def send_with_retry(
             requests.exceptions.HTTPError,
         ) as e:
             logging.exception(e)
-            logging.warning(f"{e} intercepted. Retry {retry + 1}/10")
-            retry += 1
-            time.sleep(5)
-
-    if retry == 10:
-        logging.error("Failed to send message.")
-        raise ConnectionError("Failed to send message.")
-    return False
+            logging.warning(f"{e} intercepted. Token {idx}/{len(tokens)} failed")
+
+    logging.error("Failed to send message.")
+    raise ConnectionError("Failed to send message.")
 
 
 def send_message(
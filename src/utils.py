@@ -1,12 +1,40 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from itertools import islice
-from typing import Iterable, Iterator, Tuple, TypeVar
+from typing import Callable, Iterable, Iterator, List, Sequence, Tuple, TypeVar
 
 T = TypeVar("T")
+R = TypeVar("R")
 
+#  NOTE: Upper bound on concurrent Google Ads API calls, tune here for the quota
+MAX_CONCURRENT_REQUESTS = 8
 
-def batched(iterable: Iterable[T], n: int) -> Iterator[Tuple[T, ...]]:
+
+if sys.version_info >= (3, 12):
+    from itertools import batched as _batched
+else:
+
+    def _batched(iterable: Iterable[T], n: int) -> Iterator[Tuple[T, ...]]:
+        it = iter(iterable)
+        while batch := tuple(islice(it, n)):
+            yield batch
+
+
+def batched(iterable: Iterable[T], n: int) -> Iterator[Sequence[T]]:
     if n < 1:
         raise ValueError("n must be at least one")
-    it = iter(iterable)
-    while batch := tuple(islice(it, n)):
-        yield batch
+    if isinstance(iterable, (list, tuple)):
+        return (iterable[i : i + n] for i in range(0, len(iterable), n))
+    return _batched(iterable, n)
+
+
+def thread_map(
+    func: Callable[[T], R],
+    iterable: Iterable[T],
+    max_workers: int = MAX_CONCURRENT_REQUESTS,
+) -> List[R]:
+    items = list(iterable)
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        return list(executor.map(func, items))
@@ -0,0 +1,19 @@
+import os
+from typing import Iterator
+
+import pytest
+from sqlalchemy.engine.base import Engine
+
+from src import project_dir
+from src.db import build_connection_url, create_engine
+
+
+@pytest.fixture(scope="session")
+def engine() -> Iterator[Engine]:
+    if os.getenv("DB_TYPE") is None:
+        pytest.skip("DB_TYPE not set")
+
+    os.environ["PROJECT_DIR"] = project_dir
+    engine = create_engine(build_connection_url(), echo=False)
+    yield engine
+    engine.dispose()
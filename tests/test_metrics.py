@@ -1,85 +1,134 @@
-import dataclasses
-import functools
-import json
+import itertools
 import os
-from typing import Union
+from typing import Any, Dict, Iterator, Tuple, Union
 
+import numpy as np
+import orjson
 import pytest
-from sqlalchemy import select
+from sqlalchemy import CompoundSelect, func, literal, select, union_all
+from sqlalchemy.engine.base import Connection, Engine
 
-from src.db import build_connection_url, create_engine
 from src.models import AgeMetrics, GenderMetrics, GeoMetrics, Metrics
 
-Number = Union[int, float]
 
+tests_dir = os.path.dirname(os.path.abspath(__file__))
 
-@functools.lru_cache(maxsize=None)
-def num_sim(n1: Number, n2: Number) -> Number:
-    if n1 == n2:
-        return 1
-    return 1 - abs(n1 - n2) / (n1 + n2)
-
-
-@dataclasses.dataclass
-class TargetMetrics:
-    campaign_id: int
-    impressions: Number
-    cost: Number
-    views: Number
-    start_date: str
-    end_date: str
-
-
-project_dir = os.path.dirname(os.path.dirname(__file__))
-os.environ["PROJECT_DIR"] = project_dir
-
-tests_dir = os.path.join(project_dir, "tests")
-
-connection_url = build_connection_url()
-engine = create_engine(connection_url, echo=False)
-
-with open(os.path.join(tests_dir, "data", "target_metrics.json")) as f:
-    target_metrics = [TargetMetrics(**row) for row in json.load(f)]
+TABLES = (Metrics, GenderMetrics, AgeMetrics, GeoMetrics)
+METRIC_NAMES = ("impressions", "cost_micros", "cost", "video_views")
+TARGET_METRICS_FIELDS = (
+    ("campaign_id", "i8"),
+    ("impressions", "f8"),
+    ("cost", "f8"),
+    ("views", "f8"),
+    ("start_date", "datetime64[D]"),
+    ("end_date", "datetime64[D]"),
+)
+TARGET_METRICS_NAMES = tuple(name for name, _ in TARGET_METRICS_FIELDS)
+TARGET_METRICS_DTYPE = np.dtype(list(TARGET_METRICS_FIELDS))
+
+with open(os.path.join(tests_dir, "data", "target_metrics.json"), "rb") as f:
+    target_metrics = np.array(
+        [
+            tuple(row[name] for name in TARGET_METRICS_NAMES)
+            for row in orjson.loads(f.read())
+        ],
+        dtype=TARGET_METRICS_DTYPE,
+    )
+campaign_ids = target_metrics["campaign_id"].tolist()
+
+
+@pytest.fixture(scope="session")
+def connection(engine: Engine) -> Iterator[Connection]:
+    with engine.connect() as connection:
+        yield connection
+
+
+@pytest.fixture(scope="session")
+def totals(
+    connection: Connection,
+) -> Dict[Tuple[Any, int], Tuple[float, float, float, float]]:
+    #  NOTE: Best served by an index on (campaign_id, date) that includes
+    #  impressions, cost_micros, cost and video_views
+    totals: Dict[Tuple[Any, int], Tuple[float, float, float, float]] = {}
+    for table in TABLES:
+        #  NOTE: One SELECT per target row, labelled with its index, so a campaign
+        #  listed with several date ranges gets one total per range
+        statement: CompoundSelect = union_all(
+            *(
+                select(
+                    literal(idx).label("idx"),
+                    func.coalesce(func.sum(table.impressions), 0),
+                    func.coalesce(func.sum(table.cost_micros), 0),
+                    func.coalesce(func.sum(table.cost), 0),
+                    func.coalesce(func.sum(table.video_views), 0),
+                ).where(
+                    table.campaign_id == campaign_id,
+                    table.date.between(start_date, end_date),
+                )
+                for idx, (campaign_id, start_date, end_date) in enumerate(
+                    zip(
+                        campaign_ids,
+                        target_metrics["start_date"].tolist(),
+                        target_metrics["end_date"].tolist(),
+                    )
+                )
+            )
+        )
+        for idx, impressions, cost_micros, cost, video_views in connection.execute(
+            statement
+        ):
+            totals[(table, idx)] = (impressions, cost_micros, cost, video_views)
+    return totals
+
+
+@pytest.fixture(scope="session")
+def comparisons(
+    totals: Dict[Tuple[Any, int], Tuple[float, float, float, float]],
+) -> Dict[Tuple[Any, int], Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    keys = list(itertools.product(TABLES, range(len(target_metrics))))
+    expected = np.tile(
+        np.column_stack(
+            [
+                target_metrics["impressions"],
+                target_metrics["cost"],
+                target_metrics["cost"],
+                target_metrics["views"],
+            ]
+        ),
+        (len(TABLES), 1),
+    )
+    actual = np.array([totals.get(key, (0, 0, 0, 0)) for key in keys], dtype=np.float64)
+    actual[:, 1] /= 1_000_000
+
+    #  NOTE: Same as round(1 - |a - b| / (a + b), 2) == 1.0, without the division
+    is_similar = np.abs(expected - actual) * 200 <= (expected + actual) + 1e-9
+
+    return {
+        key: (expected[row], actual[row], is_similar[row])
+        for row, key in enumerate(keys)
+    }
 
 
 @pytest.mark.parametrize(
-    "target, table",
+    "idx, table",
     [
-        (target, table)
-        for target in target_metrics
-        for table in [Metrics, GenderMetrics, AgeMetrics, GeoMetrics]
+        pytest.param(idx, table, id=f"{campaign_ids[idx]}-{table.__name__}")
+        for idx, table in itertools.product(range(len(target_metrics)), TABLES)
     ],
 )
 def test_metrics(
-    target: TargetMetrics, table: Union[Metrics, GenderMetrics, AgeMetrics, GeoMetrics]
+    comparisons: Dict[Tuple[Any, int], Tuple[np.ndarray, np.ndarray, np.ndarray]],
+    idx: int,
+    table: Union[Metrics, GenderMetrics, AgeMetrics, GeoMetrics],
 ) -> None:
-    with engine.begin() as connection:
-        rows = connection.execute(
-            select(
-                table.campaign_id,
-                table.impressions,
-                table.cost_micros,
-                table.cost,
-                table.video_views,
-            ).where(
-                table.campaign_id == target.campaign_id,
-                table.date >= target.start_date,
-                table.date <= target.end_date,
+    campaign_id = campaign_ids[idx]
+    expected, actual, is_similar = comparisons[(table, idx)]
+
+    for name, target_value, total_value, metric_is_similar in zip(
+        METRIC_NAMES, expected, actual, is_similar
+    ):
+        if not metric_is_similar:
+            pytest.fail(
+                f"{name}: campaign_id={campaign_id} "
+                f"target={target_value} actual={total_value}"
             )
-        ).fetchall()
-
-        metrics = {
-            "impressions": (target.impressions, sum(row.impressions for row in rows)),
-            "cost_micros": (target.cost, sum(row[2] for row in rows) / 1_000_000),
-            "cost": (target.cost, sum(row[3] for row in rows)),
-            "video_views": (target.views, sum(row[4] for row in rows)),
-        }
-
-        for name, (target_value, total_value) in metrics.items():
-            similarity = num_sim(target_value, total_value)
-            assert round(similarity, 2) == 1.0, {
-                "name": name,
-                "campaign_id": target.campaign_id,
-                "target": target_value,
-                name: total_value,
-            }